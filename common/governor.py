@@ -0,0 +1,341 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.ai import UsageMetadata, add_usage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig, ensure_config
+
+import config
+
+DEFAULT_TENANT = "default"
+
+# USD per million input and output tokens.
+PRICES = {
+    "claude-3-7-sonnet-20250219": (3.0, 15.0),
+    "claude-3-5-sonnet-20240620": (3.0, 15.0),
+    "claude-3-5-haiku-20241022": (0.8, 4.0),
+}
+
+
+class TokenQuotaExceeded(Exception):
+    pass
+
+
+@dataclass
+class Usage:
+    used: int = 0
+    reserved: int = 0
+    cost: float = 0.0
+    calls: int = 0
+    degraded_calls: int = 0
+    since: float = field(default_factory=time.time)
+
+
+@dataclass
+class Reservation:
+    tenant_id: str
+    run_id: str
+    model: str
+    max_tokens: int
+    input_tokens: int
+    tokens: int
+    degraded: bool = False
+
+
+class TokenGovernor:
+    """Track and limit the tokens used by LLM calls, per run and per tenant.
+
+    Before a call, its input estimate plus `max_tokens` is reserved against both quotas. A run's quota covers its whole
+    lifetime, a tenant's quota covers a window of `tenant_window` seconds, after which its usage starts over. Once the
+    used and reserved tokens pass `degrade_at` of a quota, calls switch to the cheaper `fallback_model`, and
+    `max_tokens` is cut to what is left. When less than `min_max_tokens` would be left, the call fails fast with
+    `TokenQuotaExceeded`.
+    """
+
+    def __init__(
+        self,
+        run_quota: int,
+        tenant_quota: int,
+        tenant_window: float,
+        degrade_at: float = 0.8,
+        min_max_tokens: int = 256,
+        max_runs: int = 10_000,
+    ):
+        self.run_quota = run_quota
+        self.tenant_quota = tenant_quota
+        self.tenant_window = tenant_window
+        self.degrade_at = degrade_at
+        self.min_max_tokens = min_max_tokens
+        self.max_runs = max_runs
+        self.tenants: dict[str, Usage] = {}
+        self.runs: OrderedDict[tuple[str, str], Usage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tenant(self, tenant_id: str) -> Usage:
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None or time.time() - tenant.since >= self.tenant_window:
+            # Start a new window, the calls still in flight keep their reservation.
+            tenant = self.tenants[tenant_id] = Usage(
+                reserved=tenant.reserved if tenant else 0
+            )
+
+        return tenant
+
+    def _run(self, tenant_id: str, run_id: str) -> Usage:
+        key = (tenant_id, run_id)
+        if key not in self.runs:
+            self.runs[key] = Usage()
+            # Forget the oldest idle runs, their usage still counts for the tenant.
+            for old_key in list(self.runs):
+                if len(self.runs) <= self.max_runs:
+                    break
+                if old_key != key and not self.runs[old_key].reserved:
+                    del self.runs[old_key]
+
+        self.runs.move_to_end(key)
+        return self.runs[key]
+
+    def reserve(
+        self,
+        tenant_id: str,
+        run_id: str,
+        input_tokens: int,
+        model: str,
+        max_tokens: int,
+        fallback_model: str | None = None,
+    ) -> Reservation:
+        with self._lock:
+            tenant = self._tenant(tenant_id)
+            run = self._run(tenant_id, run_id)
+
+            left = min(
+                self.run_quota - run.used - run.reserved,
+                self.tenant_quota - tenant.used - tenant.reserved,
+            )
+            if left - input_tokens < self.min_max_tokens:
+                raise TokenQuotaExceeded(
+                    f"Token quota exceeded for tenant {tenant_id!r}, run {run_id!r}."
+                )
+
+            degraded = False
+            if left - input_tokens < max_tokens:
+                max_tokens, degraded = left - input_tokens, True
+
+            if fallback_model and (
+                run.used + run.reserved >= self.degrade_at * self.run_quota
+                or tenant.used + tenant.reserved >= self.degrade_at * self.tenant_quota
+            ):
+                model, degraded = fallback_model, True
+
+            reservation = Reservation(
+                tenant_id=tenant_id,
+                run_id=run_id,
+                model=model,
+                max_tokens=max_tokens,
+                input_tokens=input_tokens,
+                tokens=input_tokens + max_tokens,
+                degraded=degraded,
+            )
+            for usage in (tenant, run):
+                usage.reserved += reservation.tokens
+                usage.calls += 1
+                usage.degraded_calls += degraded
+
+            return reservation
+
+    def commit(
+        self, reservation: Reservation, input_tokens: int = 0, output_tokens: int = 0
+    ):
+        """Release the reservation and record the tokens the call actually used. Call with no tokens if it failed."""
+
+        input_price, output_price = PRICES.get(reservation.model, (0.0, 0.0))
+        cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+        with self._lock:
+            for usage in (
+                self._tenant(reservation.tenant_id),
+                self._run(reservation.tenant_id, reservation.run_id),
+            ):
+                usage.reserved -= reservation.tokens
+                usage.used += input_tokens + output_tokens
+                usage.cost += cost
+
+    def usage(self) -> dict:
+        """A live snapshot of the usage per tenant and per run."""
+
+        with self._lock:
+            return {
+                "tenants": {
+                    tenant_id: asdict(usage)
+                    for tenant_id, usage in self.tenants.items()
+                },
+                "runs": {
+                    f"{tenant_id}/{run_id}": asdict(usage)
+                    for (tenant_id, run_id), usage in self.runs.items()
+                },
+            }
+
+
+governor = TokenGovernor(
+    run_quota=config.TOKEN_QUOTAS["RUN"],
+    tenant_quota=config.TOKEN_QUOTAS["TENANT"],
+    tenant_window=config.TOKEN_QUOTAS["TENANT_WINDOW"],
+)
+
+
+def _estimate_tokens(messages: list[BaseMessage]) -> int:
+    # Roughly 4 characters per token, the reservation is reconciled with the real usage after the call.
+    return sum(len(str(message.content)) for message in messages) // 4 + 1
+
+
+# The run config of the current LLM call, `_generate` does not receive it.
+_call_config: ContextVar[RunnableConfig] = ContextVar("call_config")
+
+
+class GovernedChatAnthropic(ChatAnthropic):
+    """`ChatAnthropic` whose calls, streamed or not, go through the `governor`.
+
+    The tenant and run are read from `configurable["tenant_id"]` and `configurable["run_id"]` of the run config.
+    Without a `run_id`, each call is its own run and only the tenant quota applies across calls, so entry points
+    should pass one. It reaches every call of the graph, including parallel branches and hedged requests.
+    """
+
+    fallback_model: str | None = "claude-3-5-haiku-20241022"
+
+    def invoke(self, input, config: RunnableConfig | None = None, **kwargs: Any):
+        token = _call_config.set(ensure_config(config))
+        try:
+            return super().invoke(input, config, **kwargs)
+        finally:
+            _call_config.reset(token)
+
+    async def ainvoke(self, input, config: RunnableConfig | None = None, **kwargs: Any):
+        token = _call_config.set(ensure_config(config))
+        try:
+            return await super().ainvoke(input, config, **kwargs)
+        finally:
+            _call_config.reset(token)
+
+    def _reserve(self, messages: list[BaseMessage], kwargs: dict) -> Reservation:
+        configurable = _call_config.get(ensure_config()).get("configurable", {})
+
+        return governor.reserve(
+            tenant_id=configurable.get("tenant_id", DEFAULT_TENANT),
+            run_id=configurable.get("run_id") or f"call-{uuid.uuid4()}",
+            input_tokens=_estimate_tokens(messages),
+            model=kwargs.get("model", self.model),
+            max_tokens=kwargs.get("max_tokens", self.max_tokens or 1024),
+            fallback_model=self.fallback_model,
+        )
+
+    def _commit(
+        self,
+        reservation: Reservation,
+        usage: UsageMetadata | None,
+        cancelled: bool = False,
+    ):
+        usage = usage or {}
+        if cancelled and not usage:
+            # A cancelled call (e.g. a losing hedge) was already sent, charge its estimated input.
+            # Any output it produced before the cancellation is unknown and not counted.
+            usage = {"input_tokens": reservation.input_tokens}
+
+        governor.commit(
+            reservation,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+        )
+
+    @staticmethod
+    def _governed_kwargs(reservation: Reservation, kwargs: dict) -> dict:
+        return {
+            **kwargs,
+            "model": reservation.model,
+            "max_tokens": reservation.max_tokens,
+        }
+
+    def _generate(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        reservation = self._reserve(messages, kwargs)
+        usage = None
+        try:
+            result = super()._generate(
+                messages,
+                stop,
+                run_manager,
+                **self._governed_kwargs(reservation, kwargs),
+            )
+            usage = result.generations[0].message.usage_metadata
+            return result
+        finally:
+            self._commit(reservation, usage)
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        reservation = self._reserve(messages, kwargs)
+        usage, cancelled = None, False
+        try:
+            result = await super()._agenerate(
+                messages,
+                stop,
+                run_manager,
+                **self._governed_kwargs(reservation, kwargs),
+            )
+            usage = result.generations[0].message.usage_metadata
+            return result
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            self._commit(reservation, usage, cancelled)
+
+    def _stream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        reservation = self._reserve(messages, kwargs)
+        usage, cancelled = None, False
+        try:
+            # The usage arrives in parts, input tokens on the first chunk and output tokens on the last.
+            for chunk in super()._stream(
+                messages,
+                stop,
+                run_manager,
+                **self._governed_kwargs(reservation, {**kwargs, "stream_usage": True}),
+            ):
+                usage = add_usage(usage, chunk.message.usage_metadata)
+                yield chunk
+        except GeneratorExit:
+            cancelled = True
+            raise
+        finally:
+            self._commit(reservation, usage, cancelled)
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        reservation = self._reserve(messages, kwargs)
+        usage, cancelled = None, False
+        try:
+            async for chunk in super()._astream(
+                messages,
+                stop,
+                run_manager,
+                **self._governed_kwargs(reservation, {**kwargs, "stream_usage": True}),
+            ):
+                usage = add_usage(usage, chunk.message.usage_metadata)
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            cancelled = True
+            raise
+        finally:
+            self._commit(reservation, usage, cancelled)
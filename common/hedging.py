@@ -0,0 +1,156 @@
+import asyncio
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+
+class HedgingPolicy:
+    """Hedge slow LLM calls to cut tail latency.
+
+    When a call runs past the `percentile` latency of recent calls with the same `key`, a duplicate request is
+    sent. The first successful result wins and the other request is cancelled. At most `budget` extra requests
+    are sent per call (e.g. `0.1` allows one hedge for every ten calls). With `GovernedChatAnthropic`, a cancelled
+    request is charged its estimated input tokens, its partial output is not metered.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.1,
+        min_samples: int = 10,
+        window: int = 100,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.latencies: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def threshold(self, key: str) -> float | None:
+        """The latency, in seconds, after which a call with this `key` is hedged. `None` until enough calls were seen."""
+
+        with self._lock:
+            latencies = sorted(self.latencies[key])
+
+        if len(latencies) < self.min_samples:
+            return None
+
+        index = math.ceil(self.percentile / 100 * len(latencies)) - 1
+        return latencies[max(index, 0)]
+
+    def record(self, key: str, latency: float):
+        with self._lock:
+            self.latencies[key].append(latency)
+
+    def _acquire_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                return False
+
+            self.hedges += 1
+            return True
+
+    async def _timed(
+        self, runnable: Runnable, input: Any, config: RunnableConfig | None
+    ):
+        start = time.monotonic()
+        result = await runnable.ainvoke(input, config)
+        return result, time.monotonic() - start
+
+    async def ainvoke(
+        self,
+        runnable: Runnable,
+        input: Any,
+        config: RunnableConfig | None = None,
+        key: str = "default",
+    ):
+        """Invoke `runnable`, hedging the call if it is slower than usual."""
+
+        with self._lock:
+            self.calls += 1
+
+        start = time.monotonic()
+        primary = asyncio.create_task(self._timed(runnable, input, config))
+        pending = {primary}
+        error = None
+
+        # Whatever way this exits, including the caller being cancelled, no request is left running.
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.threshold(key))
+            if done or not self._acquire_hedge():
+                result, latency = await primary
+                self.record(key, latency)
+                return result
+
+            hedge = asyncio.create_task(self._timed(runnable, input, config))
+            pending = {primary, hedge}
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception():
+                        error = error or task.exception()
+                        continue
+
+                    result, latency = task.result()
+                    self.record(key, latency)
+                    if task is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                        # The primary's real latency is unknown, record the time it ran as a lower bound.
+                        self.record(key, time.monotonic() - start)
+
+                    return result
+
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def invoke(
+        self,
+        runnable: Runnable,
+        input: Any,
+        config: RunnableConfig | None = None,
+        key: str = "default",
+    ):
+        """Synchronous `ainvoke`. The calls run on a shared background event loop, so the losing request can be cancelled."""
+
+        return asyncio.run_coroutine_threadsafe(
+            self.ainvoke(runnable, input, config, key), _background_loop()
+        ).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+
+        return _loop
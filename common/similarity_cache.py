@@ -0,0 +1,186 @@
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+STOP_WORDS = set(
+    "a an the about of on in to for and or me please some this that is are i you can could".split()
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str, size: int = 2) -> set[str]:
+    """The word n-grams (n = 1..size) of `text`, ignoring case, punctuation, stop words and plural `s`."""
+
+    words = [
+        (
+            word[:-1]
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss")
+            else word
+        )
+        for word in re.findall(r"\w+", text.lower())
+        if word not in STOP_WORDS
+    ]
+
+    return {
+        " ".join(words[i : i + n])
+        for n in range(1, size + 1)
+        for i in range(len(words) - n + 1)
+    } or {text}
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest())
+
+
+def _text(input: Any) -> str:
+    if isinstance(input, str):
+        return input
+
+    return "\n".join(str(getattr(message, "content", message)) for message in input)
+
+
+class SimilarityCache:
+    """An LLM response cache that also hits for near-duplicate prompts.
+
+    Prompts are compared by the Jaccard similarity of their word shingles, estimated with MinHash signatures and
+    looked up through an LSH index, all computed locally. A cached response is returned when the best match of the
+    same `node` is at least `threshold` similar. The cache holds at most `max_entries` responses and evicts the
+    least recently used one.
+
+    Only use it for nodes that can tolerate approximate hits. Changing one key word of a long prompt barely changes
+    its similarity, so nodes whose output hinges on such a word (e.g. routing) should not be cached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        max_entries: int = 1024,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 2,
+        seed: int = 0,
+    ):
+        if num_perm % bands:
+            raise ValueError("`num_perm` must be divisible by `bands`.")
+
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._entries: OrderedDict[int, tuple[str, tuple[int, ...], Any]] = (
+            OrderedDict()
+        )
+        self._buckets: dict[tuple, set[int]] = defaultdict(set)
+        self._next_id = 0
+        self.hits: dict[str, int] = defaultdict(int)
+        self.misses: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        hashes = [_hash(shingle) for shingle in shingles(text, self.shingle_size)]
+
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        )
+
+    def _band_keys(self, node: str, signature: tuple[int, ...]) -> list[tuple]:
+        return [
+            (node, band, signature[band * self.rows : (band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def lookup(self, input: Any, node: str = "default") -> Any | None:
+        """The cached response of the most similar prompt of this `node`, or `None`."""
+
+        signature = self.signature(_text(input))
+        best_id, best_similarity = None, self.threshold
+
+        with self._lock:
+            candidates = set().union(
+                *(
+                    self._buckets.get(key, ())
+                    for key in self._band_keys(node, signature)
+                )
+            )
+            for entry_id in candidates:
+                _, entry_signature, _ = self._entries[entry_id]
+                similarity = sum(
+                    x == y for x, y in zip(signature, entry_signature)
+                ) / len(signature)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses[node] += 1
+                return None
+
+            self.hits[node] += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def store(self, input: Any, value: Any, node: str = "default"):
+        signature = self.signature(_text(input))
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._entries[entry_id] = (node, signature, value)
+            for key in self._band_keys(node, signature):
+                self._buckets[key].add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        entry_id, (node, signature, _) = self._entries.popitem(last=False)
+
+        for key in self._band_keys(node, signature):
+            bucket = self._buckets[key]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def invoke(
+        self,
+        runnable: Runnable,
+        input: Any,
+        config: RunnableConfig | None = None,
+        node: str = "default",
+    ):
+        """Invoke `runnable`, or return the cached response of a similar enough prompt."""
+
+        value = self.lookup(input, node)
+        if value is None:
+            value = runnable.invoke(input, config)
+            self.store(input, value, node)
+
+        return value
+
+    def stats(self) -> dict[str, dict]:
+        """Hits, misses and hit rate per node."""
+
+        with self._lock:
+            return {
+                node: {
+                    "hits": self.hits[node],
+                    "misses": self.misses[node],
+                    "hit_rate": self.hits[node] / (self.hits[node] + self.misses[node]),
+                }
+                for node in self.hits.keys() | self.misses.keys()
+            }
@@ -9,3 +9,10 @@ API_KEYS = {
     "OPENAI": os.getenv("OPENAI_API_KEY"),
     "ANTHROPIC": os.getenv("ANTHROPIC_API_KEY"),
 }
+
+# Tokens a single run, and all runs of a tenant per window of seconds, may use (see `common/governor.py`).
+TOKEN_QUOTAS = {
+    "RUN": int(os.getenv("RUN_TOKEN_QUOTA", 200_000)),
+    "TENANT": int(os.getenv("TENANT_TOKEN_QUOTA", 2_000_000)),
+    "TENANT_WINDOW": int(os.getenv("TENANT_TOKEN_WINDOW", 86_400)),
+}
@@ -1,9 +1,11 @@
-from langchain_anthropic import ChatAnthropic
+import uuid
+
 from pydantic import BaseModel, Field
 
 import config
+from common.governor import GovernedChatAnthropic
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-5-sonnet-20240620", api_key=config.API_KEYS["ANTHROPIC"]
 )
 
@@ -19,7 +21,11 @@ class SearchQuery(BaseModel):
 
 structured_llm = llm.with_structured_output(SearchQuery)
 
-output: SearchQuery = structured_llm.invoke("What is the capital of Israel?")
+# A run id scopes the per-run token quota to this call.
+output: SearchQuery = structured_llm.invoke(
+    "What is the capital of Israel?",
+    config={"configurable": {"run_id": str(uuid.uuid4())}},
+)
 
 output
 # Example `output`:
@@ -1,8 +1,9 @@
-from langchain_anthropic import ChatAnthropic
+import uuid
 
 import config
+from common.governor import GovernedChatAnthropic
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-5-sonnet-20240620", api_key=config.API_KEYS["ANTHROPIC"]
 )
 
@@ -17,7 +18,11 @@ def add(a: int, b: int) -> int:
 
 llm_with_tools = llm.bind_tools([multiply, add])
 
-message = llm_with_tools.invoke("What is 2 times 3 and 9 plus 8?")
+# A run id scopes the per-run token quota to this call.
+message = llm_with_tools.invoke(
+    "What is 2 times 3 and 9 plus 8?",
+    config={"configurable": {"run_id": str(uuid.uuid4())}},
+)
 
 message.tool_calls
 # Example `message.tool_calls`:
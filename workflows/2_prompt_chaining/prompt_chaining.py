@@ -1,14 +1,20 @@
-from langchain_anthropic import ChatAnthropic
+import uuid
+
 from langgraph.graph import END, START, StateGraph
 from pydantic import BaseModel
 from typing_extensions import TypedDict
 
 import config
+from common.governor import GovernedChatAnthropic
+from common.similarity_cache import SimilarityCache
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-5-sonnet-20240620", api_key=config.API_KEYS["ANTHROPIC"]
 )
 
+# Reuse the joke of a near-duplicate topic (e.g. "cats" and "a cat").
+similarity_cache = SimilarityCache(threshold=0.8, max_entries=1024)
+
 
 class State(TypedDict):
     topic: str
@@ -18,7 +24,9 @@ class State(TypedDict):
 
 
 def generate_joke(state: State):
-    message = llm.invoke(f"Write a joke about {state.get("topic")}")
+    message = similarity_cache.invoke(
+        llm, f"Write a joke about {state.get("topic")}", node="generate_joke"
+    )
     return {"joke": message.content}
 
 
@@ -68,7 +76,10 @@ workflow.add_edge("polish_joke", END)
 
 chain = workflow.compile()
 
-state = chain.invoke({"topic": "cats"})
+# A run id scopes the per-run token quota to this chain.
+state = chain.invoke(
+    {"topic": "cats"}, config={"configurable": {"run_id": str(uuid.uuid4())}}
+)
 
 state
 # Example `state`:
@@ -1,14 +1,23 @@
+import uuid
 from typing import TypedDict
 
-from langchain_anthropic import ChatAnthropic
 from langgraph.graph import END, START, StateGraph
 
 import config
+from common.governor import GovernedChatAnthropic
+from common.hedging import HedgingPolicy
+from common.similarity_cache import SimilarityCache
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-5-sonnet-20240620", api_key=config.API_KEYS["ANTHROPIC"]
 )
 
+# Hedge branch calls that run past the p95 latency of recent calls, with up to 10% extra requests.
+hedging = HedgingPolicy(percentile=95, budget=0.1)
+
+# Reuse the answer of a near-duplicate topic (e.g. "cats" and "a cat").
+similarity_cache = SimilarityCache(threshold=0.8, max_entries=1024)
+
 
 class State(TypedDict):
     topic: str
@@ -18,18 +27,29 @@ class State(TypedDict):
     aggregated_outputs: str
 
 
+def call_llm(prompt: str, node: str):
+    """Answer from the similarity cache, or make a hedged LLM call."""
+
+    message = similarity_cache.lookup(prompt, node)
+    if message is None:
+        message = hedging.invoke(llm, prompt, key=node)
+        similarity_cache.store(prompt, message, node)
+
+    return message
+
+
 def write_joke(state: State):
-    message = llm.invoke(f"Write a joke about {state.get("topic")}")
+    message = call_llm(f"Write a joke about {state.get("topic")}", "write_joke")
     return {"joke": message.content}
 
 
 def write_story(state: State):
-    message = llm.invoke(f"Write a story about {state.get("topic")}")
+    message = call_llm(f"Write a story about {state.get("topic")}", "write_story")
     return {"story": message.content}
 
 
 def write_poem(state: State):
-    message = llm.invoke(f"Write a poem about {state.get("topic")}")
+    message = call_llm(f"Write a poem about {state.get("topic")}", "write_poem")
     return {"poem": message.content}
 
 
@@ -55,7 +75,10 @@ parallel_workflow.add_edge("aggregator", END)
 
 parallel_chain = parallel_workflow.compile()
 
-state = parallel_chain.invoke({"topic": "rugelach"})
+# A run id scopes the per-run token quota to this workflow, across its parallel branches.
+state = parallel_chain.invoke(
+    {"topic": "rugelach"}, config={"configurable": {"run_id": str(uuid.uuid4())}}
+)
 
 state
 # Example `state`:
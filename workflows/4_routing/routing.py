@@ -1,12 +1,14 @@
-from langchain_anthropic import ChatAnthropic
+import uuid
+
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import END, START, StateGraph
 from pydantic import BaseModel, Field
 from typing_extensions import Literal, TypedDict
 
 import config
+from common.governor import GovernedChatAnthropic
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-5-sonnet-20240620", api_key=config.API_KEYS["ANTHROPIC"]
 )
 
@@ -86,7 +88,11 @@ router_workflow.add_edge("write_poem", END)
 
 router_chain = router_workflow.compile()
 
-state = router_chain.invoke({"input": "I want to hear a joke."})
+# A run id scopes the per-run token quota to this request.
+state = router_chain.invoke(
+    {"input": "I want to hear a joke."},
+    config={"configurable": {"run_id": str(uuid.uuid4())}},
+)
 
 state
 # Example `state`:
@@ -1,21 +1,26 @@
 import json
 import operator
 import os
+import uuid
 from typing import Annotated, List, TypedDict
 
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.constants import Send
 from langgraph.graph import END, START, StateGraph
 from pydantic import BaseModel, Field
 
 import config
+from common.governor import GovernedChatAnthropic
+from common.hedging import HedgingPolicy
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-7-sonnet-20250219",
     api_key=config.API_KEYS["ANTHROPIC"],
 )
 
+# Hedge worker calls that run past the p95 latency of recent calls, with up to 10% extra requests.
+hedging = HedgingPolicy(percentile=95, budget=0.1)
+
 
 # Report schema
 class Section(BaseModel):
@@ -64,7 +69,8 @@ def orchestrator(state: State):
 def worker(state: WorkerState):
     """Worker function that writes one section of the report."""
 
-    section = llm.invoke(
+    section = hedging.invoke(
+        llm,
         [
             SystemMessage(
                 content="You are an expert report writer. Write a section for a report."
@@ -72,7 +78,8 @@ def worker(state: WorkerState):
             HumanMessage(
                 content=f"Here is the name of the section: {state["section"].name}, and the description of the section: {state["section"].description}."
             ),
-        ]
+        ],
+        key="worker",
     )
     return {"completed_sections": [section.content]}
 
@@ -104,10 +111,12 @@ orchestrator_worker_builder.add_edge("aggregator", END)
 
 orchestrator_worker = orchestrator_worker_builder.compile()
 
+# A run id scopes the per-run token quota to this report, across all of its workers.
 state = orchestrator_worker.invoke(
     {
         "topic": "Introduction to the concept of Model Context Provider, and how it can be used for agentic AI workflows."
-    }
+    },
+    config={"configurable": {"run_id": str(uuid.uuid4())}},
 )
 
 with open(os.path.join(os.path.dirname(__file__), "final_report.md"), "w") as f:
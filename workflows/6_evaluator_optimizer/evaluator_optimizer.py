@@ -1,17 +1,18 @@
 import json
 import operator
 import os
+import uuid
 from typing import Annotated, List, Literal, TypedDict
 
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.constants import Send
 from langgraph.graph import END, START, StateGraph
 from pydantic import BaseModel, Field
 
 import config
+from common.governor import GovernedChatAnthropic
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-7-sonnet-20250219",
     api_key=config.API_KEYS["ANTHROPIC"],
 )
@@ -83,10 +84,12 @@ optimizer_builder.add_conditional_edges(
 
 optimizer = optimizer_builder.compile()
 
+# A run id scopes the per-run token quota to this feedback loop.
 state = optimizer.invoke(
     {
         "topic": "How can I stay hydrated all day long?",
-    }
+    },
+    config={"configurable": {"run_id": str(uuid.uuid4())}},
 )
 
 
@@ -1,9 +1,23 @@
 import json
 import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
 from typing import Literal
 
 from pydantic import BaseModel
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DB_DIR = os.path.dirname(__file__)
+DEFAULT_TENANT = "default"
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
 
 class Invoice(BaseModel):
     id: int
@@ -17,33 +31,146 @@ class Invoice(BaseModel):
 
 
 class Database:
-    path = os.path.join(os.path.dirname(__file__), "db.json")
+    """A JSON-file invoice database for a single tenant.
+
+    Writes hold an exclusive cross-process file lock and replace the file atomically, so readers never
+    take the lock and always see a complete snapshot.
+    """
 
-    def __init__(self):
+    def __init__(self, tenant_id: str = DEFAULT_TENANT):
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+
+        self.tenant_id = tenant_id
+        self.path = os.path.join(
+            DB_DIR, "db.json" if tenant_id == DEFAULT_TENANT else f"db.{tenant_id}.json"
+        )
+        self.lock_path = f"{self.path}.lock"
+        self.invoices: list[Invoice] = []
+        self._version = None
+        self._thread_lock = threading.Lock()
         self.load()
 
+    @staticmethod
+    def _version_of(stat: os.stat_result):
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _stat_version(self):
+        try:
+            return self._version_of(os.stat(self.path))
+        except FileNotFoundError:
+            return None
+
+    def _read(self) -> tuple[list[Invoice], tuple | None]:
+        try:
+            with open(self.path, "r") as f:
+                version = self._version_of(os.fstat(f.fileno()))
+                db = json.load(f)
+        except FileNotFoundError:
+            return [], None
+
+        return [Invoice(**invoice) for invoice in db], version
+
     def load(self):
-        with open(self.path, "r") as f:
-            db = json.load(f)
-            self.invoices = [Invoice(**invoice) for invoice in db]
+        self.invoices, self._version = self._read()
+
+    def refresh(self):
+        """Reload the invoices if another handle or process has written the file since the last load."""
+
+        if self._stat_version() != self._version:
+            self.load()
+
+    @contextmanager
+    def lock(self):
+        """Hold an exclusive lock for this tenant, across threads and processes."""
+
+        with self._thread_lock, open(self.lock_path, "a+") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
 
     def get_invoices(self):
+        self.refresh()
         return self.invoices
 
     def get_total_amount(self):
-        return sum(invoice.amount for invoice in self.invoices)
+        return sum(invoice.amount for invoice in self.get_invoices())
 
     def count_invoices(self):
-        return len(self.invoices)
+        return len(self.get_invoices())
 
-    def add_invoice(self, invoice: Invoice):
-        self.invoices.append(invoice)
-        self.save()
+    def create_invoice(
+        self, amount: float, date: str, type: Literal["IN", "OUT"], description: str
+    ) -> Invoice:
+        """Create an invoice with the next free ID. The ID is allocated under the tenant lock, so concurrent writers never share one."""
+
+        with self.lock():
+            # Work on a local list, readers may replace `self.invoices` with an older snapshot at any time.
+            invoices, _ = self._read()
+
+            invoice = Invoice(
+                id=max((invoice.id for invoice in invoices), default=0) + 1,
+                amount=amount,
+                date=date,
+                type=type,
+                description=description,
+            )
+            invoices = invoices + [invoice]
+            version = self.save(invoices)
+
+        self.invoices, self._version = invoices, version
 
         return invoice
 
-    def save(self):
-        db = [invoice.model_dump() for invoice in self.invoices]
+    def save(self, invoices: list[Invoice]) -> tuple:
+        """Atomically replace the database file and return its new version. Must be called while holding `lock()`."""
+
+        db = [invoice.model_dump() for invoice in invoices]
+
+        try:
+            mode = os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path), prefix=".db.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(db, f)
+                f.flush()
+                os.fsync(f.fileno())
+                # Taken before the rename, another process may replace the file right after it.
+                version = self._version_of(os.fstat(f.fileno()))
+            # `mkstemp` creates the file readable by its owner only, keep it readable by other workers.
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        return version
+
+
+_databases: dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(tenant_id: str = DEFAULT_TENANT) -> Database:
+    """Get the shared database handle for a tenant, creating it on first use."""
+
+    with _databases_lock:
+        if tenant_id not in _databases:
+            _databases[tenant_id] = Database(tenant_id)
 
-        with open(self.path, "w") as f:
-            json.dump(db, f)
+        return _databases[tenant_id]
@@ -1,10 +1,9 @@
-from langchain_anthropic import ChatAnthropic
-
 import config
+from common.governor import GovernedChatAnthropic
 
 from .tools import tools
 
-llm = ChatAnthropic(
+llm = GovernedChatAnthropic(
     model="claude-3-7-sonnet-20250219",
     api_key=config.API_KEYS["ANTHROPIC"],
 )
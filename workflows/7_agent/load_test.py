@@ -0,0 +1,377 @@
+"""Load test the agent with many concurrent sessions against a local fake Anthropic endpoint.
+
+Usage:
+    python -m workflows.7_agent.load_test --sessions 200 --turns 2 --think-time 1 --llm-latency 0.5
+
+The fake endpoint runs in its own process and answers every LLM call with a scripted tool-calling response, so the
+agent runs its full tool loop without calling the real API. The sessions share `--tenants` tenant databases
+(`loadtest-0`, `loadtest-1`, ...), which start as copies of `db.json`.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+# The tool calls the fake LLM makes in each step of a turn, before its final answer.
+SCRIPT = [
+    [("get_todays_date", {})],
+    [("get_all_invoices", {}), ("get_total_amount_of_invoices", {})],
+    [("get_highest_outgoing_invoice", {}), ("get_highest_incoming_invoice", {})],
+    [
+        (
+            "create_invoice",
+            {
+                "amount": 2500.0,
+                "date": "2025-03-08",
+                "type": "OUT",
+                "description": "MacBook Pro for the office",
+            },
+        )
+    ],
+]
+
+PROMPT = """
+Can you please list all of my invoices, tell me which outgoing and incoming invoices have the highest amounts,
+calculate the total amount of all invoices, and create an invoice for the 2,500$ MacBook Pro I bought today?
+"""
+
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    """Answer `POST /v1/messages` with the next step of `SCRIPT` for the conversation."""
+
+    latency = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        request = json.loads(body)
+
+        # The step is the number of assistant messages since the last user text message.
+        step = 0
+        for message in reversed(request["messages"]):
+            if message["role"] == "assistant":
+                step += 1
+            elif not all(
+                isinstance(block, dict) and block.get("type") == "tool_result"
+                for block in message["content"]
+            ):
+                break
+
+        if step < len(SCRIPT):
+            content = [{"type": "text", "text": "Let me check that for you."}] + [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                    "name": name,
+                    "input": args,
+                }
+                for name, args in SCRIPT[step]
+            ]
+            stop_reason = "tool_use"
+        else:
+            content = [{"type": "text", "text": "Here is everything you asked for."}]
+            stop_reason = "end_turn"
+
+        time.sleep(random.uniform(0.5, 1.5) * self.latency)
+
+        response = json.dumps(
+            {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "model": request["model"],
+                "content": content,
+                "stop_reason": stop_reason,
+                "stop_sequence": None,
+                "usage": {
+                    "input_tokens": len(body) // 4,
+                    "output_tokens": len(json.dumps(content)) // 4,
+                },
+            }
+        ).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAnthropicServer(ThreadingHTTPServer):
+    # Read by `listen()` when the server is created, the default of 5 drops connections when sessions start together.
+    request_queue_size = 1024
+
+
+def serve_fake_anthropic(latency: float, ports: multiprocessing.Queue):
+    FakeAnthropicHandler.latency = latency
+    server = FakeAnthropicServer(("127.0.0.1", 0), FakeAnthropicHandler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class Metrics(BaseCallbackHandler):
+    """Collect LLM and tool timings from the agent's callbacks."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.turn_latencies: list[float] = []
+        self.llm_latencies: list[float] = []
+        self.tool_latencies: dict[str, list[float]] = defaultdict(list)
+        self.llm_in_flight = 0
+        self.max_llm_in_flight = 0
+        self.errors: list[str] = []
+        self._starts: dict = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._starts[run_id] = time.monotonic()
+            self.llm_in_flight += 1
+            self.max_llm_in_flight = max(self.max_llm_in_flight, self.llm_in_flight)
+
+    def _llm_done(self, run_id):
+        with self._lock:
+            self.llm_latencies.append(time.monotonic() - self._starts.pop(run_id))
+            self.llm_in_flight -= 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._llm_done(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_done(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        with self._lock:
+            self._starts[run_id] = (serialized["name"], time.monotonic())
+
+    def _tool_done(self, run_id):
+        with self._lock:
+            name, start = self._starts.pop(run_id)
+            self.tool_latencies[name].append(time.monotonic() - start)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._tool_done(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._tool_done(run_id)
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+
+    values = sorted(values)
+    p50, p95, p99 = (
+        values[min(int(p / 100 * len(values)), len(values) - 1)] for p in (50, 95, 99)
+    )
+    return f"p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms p99={p99 * 1000:.0f}ms"
+
+
+def rss_mb() -> float:
+    """The current resident memory of this process, or its peak where `/proc` is not available."""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+
+    # `ru_maxrss` is in bytes on macOS and in KiB elsewhere.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+async def run_session(agent, metrics: Metrics, args, index: int, active: list[int]):
+    await asyncio.sleep(random.uniform(0, args.ramp_up))
+
+    config = {
+        "configurable": {
+            "tenant_id": f"loadtest-{index % args.tenants}",
+            "run_id": f"session-{index}",
+        },
+        "callbacks": [metrics],
+    }
+    messages = []
+
+    active[0] += 1
+    try:
+        for turn in range(args.turns):
+            if turn:
+                await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+            start = time.monotonic()
+            state = await agent.ainvoke(
+                {"messages": messages + [HumanMessage(content=PROMPT)]}, config
+            )
+            metrics.turn_latencies.append(time.monotonic() - start)
+            messages = state["messages"]
+    except Exception as e:
+        metrics.errors.append(f"{type(e).__name__}: {e}")
+    finally:
+        active[0] -= 1
+
+
+async def sample_memory(args, active: list[int], samples: list):
+    start = time.monotonic()
+    while True:
+        samples.append((time.monotonic() - start, active[0], rss_mb()))
+        await asyncio.sleep(args.sample_interval)
+
+
+async def run(args):
+    # Imported here, so the LLM client is created after pointing it to the fake endpoint.
+    from .agent import agent
+    from .db import get_database
+
+    for tenant in range(args.tenants):
+        db = get_database(f"loadtest-{tenant}")
+        shutil.copy(get_database().path, db.path)
+        db.load()
+
+    # The agent's nodes are synchronous and run in the loop's executor, its size caps the concurrent sessions.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=args.workers or args.sessions)
+    )
+
+    metrics = Metrics()
+    active, samples = [0], []
+    sampler = asyncio.create_task(sample_memory(args, active, samples))
+
+    start = time.monotonic()
+    await asyncio.gather(
+        *(
+            run_session(agent, metrics, args, index, active)
+            for index in range(args.sessions)
+        )
+    )
+    duration = time.monotonic() - start
+
+    sampler.cancel()
+    samples.append((duration, active[0], rss_mb()))
+
+    report(args, metrics, duration, samples)
+
+
+def report(args, metrics: Metrics, duration: float, samples: list):
+    from common.governor import governor
+
+    from .db import get_database
+
+    turns = len(metrics.turn_latencies)
+    tool_latencies = [t for ts in metrics.tool_latencies.values() for t in ts]
+
+    print(f"\nSessions: {args.sessions}, turns: {turns}, errors: {len(metrics.errors)}")
+    for error in sorted(set(metrics.errors))[:5]:
+        print(f"  {error}")
+    print(f"Duration: {duration:.1f}s")
+    print(
+        f"Throughput: {turns / duration:.2f} turns/s, {len(metrics.llm_latencies) / duration:.2f} LLM calls/s"
+    )
+    print(f"Turn latency: {percentiles(metrics.turn_latencies)}")
+    print(
+        f"LLM latency: {percentiles(metrics.llm_latencies)}, max concurrency: {metrics.max_llm_in_flight}"
+    )
+    print(f"Tool execution: {percentiles(tool_latencies)}")
+    for name, latencies in sorted(metrics.tool_latencies.items()):
+        print(f"  {name}: {percentiles(latencies)} ({len(latencies)} calls)")
+
+    for tenant in range(args.tenants):
+        ids = [
+            invoice.id for invoice in get_database(f"loadtest-{tenant}").get_invoices()
+        ]
+        print(
+            f"Database loadtest-{tenant}: {len(ids)} invoices, {len(ids) - len(set(ids))} duplicate IDs"
+        )
+
+    tokens = sum(usage["used"] for usage in governor.usage()["tenants"].values())
+    print(f"Tokens used: {tokens}")
+
+    print("\nMemory over time:")
+    print(f"{'time':>8} {'active':>7} {'rss':>10}")
+    for elapsed, active, rss in samples:
+        print(f"{elapsed:7.1f}s {active:7d} {rss:8.1f}MB")
+    print(
+        f"Growth: {samples[-1][2] - samples[0][2]:.1f}MB, "
+        f"{(samples[-1][2] - samples[0][2]) / args.sessions * 1024:.0f}KB per session"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=2, help="User turns per session.")
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=1.0,
+        help="Mean seconds between a session's turns.",
+    )
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=5.0,
+        help="Seconds over which the sessions start.",
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0.5,
+        help="Mean seconds the fake endpoint takes to answer.",
+    )
+    parser.add_argument(
+        "--tenants",
+        type=int,
+        default=1,
+        help="Number of tenant databases the sessions are spread over.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Threads running the agent's nodes, defaults to one per session.",
+    )
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve_fake_anthropic, args=(args.llm_latency, ports), daemon=True
+    )
+    server.start()
+
+    os.environ["ANTHROPIC_API_URL"] = f"http://127.0.0.1:{ports.get()}"
+    os.environ.setdefault("ANTHROPIC_API_KEY", "fake")
+    # Don't let the token governor cut the sessions short, unless quotas are set explicitly.
+    os.environ.setdefault("RUN_TOKEN_QUOTA", str(10**12))
+    os.environ.setdefault("TENANT_TOKEN_QUOTA", str(10**12))
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import uuid
+
 from langchain_core.messages import HumanMessage
 
 from .agent import agent
@@ -20,7 +22,8 @@ messages = [
 
 state = {"messages": messages}
 
-response = agent.invoke(state)
+# A run id scopes the per-run token quota to this conversation.
+response = agent.invoke(state, config={"configurable": {"run_id": str(uuid.uuid4())}})
 
 for message in response["messages"]:
     message.pretty_print()
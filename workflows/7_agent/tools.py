@@ -1,11 +1,18 @@
 from datetime import datetime
 from typing import Literal
 
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
-from .db import Database, Invoice
+from .db import DEFAULT_TENANT, Database, Invoice, get_database
 
-db = Database()
+
+def get_tenant_database(config: RunnableConfig) -> Database:
+    """Get the database of the tenant set in `config["configurable"]["tenant_id"]`."""
+
+    tenant_id = config.get("configurable", {}).get("tenant_id", DEFAULT_TENANT)
+
+    return get_database(tenant_id)
 
 
 @tool
@@ -16,38 +23,50 @@ def get_todays_date() -> str:
 
 
 @tool
-def get_all_invoices() -> list[str]:
+def get_all_invoices(config: RunnableConfig) -> list[str]:
     """Get all invoices."""
 
+    db = get_tenant_database(config)
+
     return [str(invoice) for invoice in db.get_invoices()]
 
 
 @tool
-def get_highest_outgoing_invoice() -> str:
+def get_highest_outgoing_invoice(config: RunnableConfig) -> str:
     """Get the invoice with the highest amount and type `OUT`."""
 
+    db = get_tenant_database(config)
     invoices = db.get_invoices()
     outgoing_invoices = [invoice for invoice in invoices if invoice.type == "OUT"]
-    max_outgoing_invoice = max(outgoing_invoices, key=lambda x: x.amount)
+    max_outgoing_invoice = max(outgoing_invoices, key=lambda x: x.amount, default=None)
+
+    if max_outgoing_invoice is None:
+        return "There are no outgoing invoices."
 
     return str(max_outgoing_invoice)
 
 
 @tool
-def get_highest_incoming_invoice() -> str:
+def get_highest_incoming_invoice(config: RunnableConfig) -> str:
     """Get the invoice with the highest amount and type `IN`."""
 
+    db = get_tenant_database(config)
     invoices = db.get_invoices()
     incoming_invoices = [invoice for invoice in invoices if invoice.type == "IN"]
-    max_incoming_invoice = max(incoming_invoices, key=lambda x: x.amount)
+    max_incoming_invoice = max(incoming_invoices, key=lambda x: x.amount, default=None)
+
+    if max_incoming_invoice is None:
+        return "There are no incoming invoices."
 
     return str(max_incoming_invoice)
 
 
 @tool
-def get_total_amount_of_invoices() -> float:
+def get_total_amount_of_invoices(config: RunnableConfig) -> float:
     """Get the total amount of all invoices."""
 
+    db = get_tenant_database(config)
+
     return db.get_total_amount()
 
 
@@ -55,16 +74,16 @@ def get_total_amount_of_invoices() -> float:
     description="Add an invoice to the database. `date` must be in YYYY-MM-DD format."
 )
 def create_invoice(
-    amount: float, date: str, type: Literal["IN", "OUT"], description: str
+    amount: float,
+    date: str,
+    type: Literal["IN", "OUT"],
+    description: str,
+    config: RunnableConfig,
 ) -> Invoice:
-    invoice = Invoice(
-        id=db.count_invoices() + 1,
-        amount=amount,
-        date=date,
-        type=type,
-        description=description,
+    db = get_tenant_database(config)
+    invoice = db.create_invoice(
+        amount=amount, date=date, type=type, description=description
     )
-    db.add_invoice(invoice)
 
     return str(invoice)
 
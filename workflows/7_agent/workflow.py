@@ -1,6 +1,7 @@
 from typing import Literal
 
 from langchain_core.messages import SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, MessagesState
 
 from .llm import llm_with_tools
@@ -24,8 +25,8 @@ def llm_call(state: MessagesState) -> MessagesState:
     return {"messages": [response]}
 
 
-def tool_node(state: MessagesState) -> MessagesState:
-    """Execute the tool calls from the last message, and append the results."""
+def tool_node(state: MessagesState, config: RunnableConfig) -> MessagesState:
+    """Execute the tool calls from the last message, and append the results. The run's `config` is passed on, so tools use the run's tenant database."""
 
     tool_results = []
     last_tool_calls = state["messages"][-1].tool_calls or []
@@ -36,7 +37,7 @@ def tool_node(state: MessagesState) -> MessagesState:
         args = tool_call["args"]
 
         tool = tools_by_name[name]
-        tool_result: str = tool.invoke(args)
+        tool_result: str = tool.invoke(args, config)
 
         tool_results.append(
             ToolMessage(